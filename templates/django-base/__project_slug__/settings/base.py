@@ -203,9 +203,20 @@ REST_AUTH_REGISTER_SERIALIZERS = {
     'REGISTER_SERIALIZER': 'accounts.api.serializers.CustomRegisterSerializer',
 }
 
-REST_USE_JWT = False
+# Stateless JWT auth (opt-in with USE_JWT=true). Access tokens are verified
+# in-process, so authenticated requests skip the authtoken_token lookup.
+REST_USE_JWT = os.getenv('USE_JWT', '').lower() in ('true', '1', 'yes')
 REST_SESSION_LOGIN = False
 
+if REST_USE_JWT:
+    REST_AUTH = {
+        'USE_JWT': True,
+        'SESSION_LOGIN': REST_SESSION_LOGIN,
+        'JWT_AUTH_COOKIE': 'auth',
+        'JWT_AUTH_REFRESH_COOKIE': 'refresh',
+    }
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].insert(0, 'dj_rest_auth.jwt_auth.JWTCookieAuthentication')
+
 # Email Configuration (for development)
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 
@@ -11,7 +11,8 @@ Required environment variables:
 - DJANGO_SETTINGS_MODULE={{ project_slug }}.settings.cloud_production
 - GCP_PROJECT_ID (optional, auto-detected on Cloud Run)
 
-Required secrets in Secret Manager (application_settings):
+Required keys in the application_settings secret (a single dotenv-formatted
+payload, fetched with one Secret Manager call):
 - DATABASE_URL
 - SECRET_KEY
 - GS_BUCKET_NAME
@@ -21,6 +22,8 @@ Required secrets in Secret Manager (application_settings):
 
 import io
 import os
+import re
+from functools import lru_cache
 from google.cloud import secretmanager
 
 from .base import *
@@ -29,28 +32,49 @@ from .base import *
 # Load secrets from Google Secret Manager
 # =============================================================================
 
+@lru_cache(maxsize=32)
+def _access_secret(project_id: str, secret_id: str) -> bytes:
+    """Fetch the raw payload of the latest secret version (cached per process)."""
+    client = secretmanager.SecretManagerServiceClient()
+    try:
+        name = f"projects/{project_id}/secrets/{secret_id}/versions/latest"
+        response = client.access_secret_version(request={"name": name})
+        return response.payload.data
+    finally:
+        # Settings load in the gunicorn master under --preload; gRPC channels
+        # don't survive fork, so none may be left open for the workers
+        client.transport.close()
+
+
 def get_secret(secret_id: str, project_id: str = None) -> str:
     """Fetch a secret from Google Secret Manager."""
     if project_id is None:
         project_id = os.environ.get("GCP_PROJECT_ID") or os.environ.get("GOOGLE_CLOUD_PROJECT")
-    
-    client = secretmanager.SecretManagerServiceClient()
-    name = f"projects/{project_id}/secrets/{secret_id}/versions/latest"
-    response = client.access_secret_version(request={"name": name})
-    return response.payload.data.decode("UTF-8")
+
+    return _access_secret(project_id, secret_id).decode("UTF-8")
 
 
-# Load application settings from Secret Manager
-try:
+# Load application settings from Secret Manager.
+# Every setting lives in this one dotenv-formatted secret so startup costs a
+# single Secret Manager RPC; add new keys to it rather than creating
+# per-setting secrets.
+def _load_env():
+    """Read the settings secret into an environ.Env."""
     import environ
     env = environ.Env()
-    
-    secret_payload = get_secret("application_settings")
-    env.read_env(io.StringIO(secret_payload))
-except Exception as e:
-    import logging
-    logging.warning(f"Could not load secrets from Secret Manager: {e}")
-    env = environ.Env()
+    try:
+        secret_payload = get_secret("application_settings")
+        env.read_env(io.StringIO(secret_payload))
+    except Exception as e:
+        import logging
+        logging.warning(f"Could not load secrets from Secret Manager: {e}")
+    return env
+
+
+env = _load_env()
+
+# Splits comma-separated settings, swallowing whitespace around each comma
+_CSV = re.compile(r"\s*,\s*")
 
 # =============================================================================
 # Core Settings
@@ -60,7 +84,7 @@ DEBUG = env.bool("DEBUG", default=False)
 SECRET_KEY = env("SECRET_KEY")
 
 # Parse ALLOWED_HOSTS from comma-separated string
-ALLOWED_HOSTS = [h.strip() for h in env("ALLOWED_HOSTS", default="").split(",") if h.strip()]
+ALLOWED_HOSTS = list(dict.fromkeys(h for h in _CSV.split(env("ALLOWED_HOSTS", default="").strip(", ")) if h))
 
 # =============================================================================
 # Database - Cloud SQL via Unix socket
@@ -70,22 +94,35 @@ DATABASES = {
     "default": env.db("DATABASE_URL")
 }
 
+# Keep connections open between requests instead of reconnecting (socket +
+# auth handshake) every time; health checks drop ones the server has closed
+DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=600)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
 # =============================================================================
 # Static Files - WhiteNoise
 # =============================================================================
 
-MIDDLEWARE.insert(1, "whitenoise.middleware.WhiteNoiseMiddleware")
+# WhiteNoiseMiddleware is already in base MIDDLEWARE right after
+# SecurityMiddleware; don't add it again or every request runs it twice
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Serve from the file index built at startup; never rescan or consult finders
+# per request, whatever DEBUG is set to
+WHITENOISE_AUTOREFRESH = False
+WHITENOISE_USE_FINDERS = False
+
 STORAGES = {
     "default": {
-        "BACKEND": "storages.backends.gcloud.GoogleCloudStorage",
+        "BACKEND": "{{ project_slug }}.storage.PublicGoogleCloudStorage",
         "OPTIONS": {
             "bucket_name": env("GS_BUCKET_NAME"),
         },
     },
+    # collectstatic writes .gz and, with whitenoise[brotli] installed, .br
+    # variants that WhiteNoise serves to clients sending Accept-Encoding: br
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
@@ -103,9 +140,9 @@ GS_QUERYSTRING_AUTH = False
 # CORS Configuration
 # =============================================================================
 
-CORS_ALLOWED_ORIGINS = [
-    o.strip() for o in env("CORS_ALLOWED_ORIGINS", default="").split(",") if o.strip()
-]
+CORS_ALLOWED_ORIGINS = tuple(dict.fromkeys(
+    o for o in _CSV.split(env("CORS_ALLOWED_ORIGINS", default="").strip(", ")) if o
+))
 CORS_ALLOW_CREDENTIALS = True
 
 if CORS_ALLOWED_ORIGINS:
@@ -120,6 +157,8 @@ SECURE_SSL_REDIRECT = True
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
+if REST_USE_JWT:
+    REST_AUTH = {**REST_AUTH, 'JWT_AUTH_SECURE': True}
 
 # =============================================================================
 # Logging
@@ -130,7 +169,9 @@ LOGGING = {
     "disable_existing_loggers": False,
     "formatters": {
         "json": {
-            "format": '{"time": "%(asctime)s", "level": "%(levelname)s", "name": "%(name)s", "message": "%(message)s"}',
+            "()": "pythonjsonlogger.json.JsonFormatter",
+            "format": "%(asctime)s %(levelname)s %(name)s %(message)s",
+            "rename_fields": {"asctime": "time", "levelname": "level"},
         },
     },
     "handlers": {
@@ -0,0 +1,80 @@
+"""
+Storage backends for {{ project_slug }}.
+"""
+
+from functools import lru_cache
+from urllib.parse import quote
+
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud.storage import Client
+from requests.adapters import HTTPAdapter
+from storages.backends.gcloud import GoogleCloudStorage
+from storages.utils import clean_name
+
+# Connections kept open to storage.googleapis.com per process; comfortably
+# above the gunicorn thread count so concurrent uploads never queue.
+HTTP_POOL_SIZE = 32
+
+# Calls combined into one HTTP request by delete_many(); GCS batches take up
+# to 100 calls each
+BATCH_SIZE = 100
+
+
+@lru_cache(maxsize=None)
+def _shared_client(project_id=None, credentials=None):
+    """Return one storage Client per (project, credentials) for the process."""
+    if credentials is None:
+        credentials, default_project = google.auth.default(scopes=Client.SCOPE)
+        project_id = project_id or default_project
+    session = AuthorizedSession(credentials)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+    return Client(project=project_id, credentials=credentials, _http=session)
+
+
+class PublicGoogleCloudStorage(GoogleCloudStorage):
+    """
+    GoogleCloudStorage that builds public media URLs as plain strings.
+
+    The stock backend creates a client, bucket and blob object just to read
+    ``blob.public_url``. For public objects the URL is fully determined by the
+    bucket and object name, so serializing many media fields never needs a
+    storage client. Signed URLs still go through the parent implementation.
+
+    When a client is needed it is shared by every instance in the process, so
+    uploads reuse one pool of authenticated keep-alive connections.
+    """
+
+    @property
+    def client(self):
+        if self._client is None:
+            # iam_sign_blob only exists from django-storages 1.14.6
+            if getattr(self, "iam_sign_blob", False) and not self.credentials:
+                return super().client
+            self._client = _shared_client(self.project_id, self.credentials)
+        return self._client
+
+    def url(self, name, parameters=None):
+        blob_name = self._normalize_name(clean_name(name))
+        acl = self.get_object_parameters(blob_name).get("acl", self.default_acl)
+        if acl != "publicRead" and self.querystring_auth:
+            # The parent applies location itself
+            return super().url(name, parameters=parameters)
+
+        if self.custom_endpoint:
+            return f"{self.custom_endpoint}/{quote(blob_name, safe='/~')}"
+        return f"https://storage.googleapis.com/{self.bucket_name}/{quote(blob_name, safe='/~')}"
+
+    def delete_many(self, names):
+        """
+        Delete several objects, sending up to BATCH_SIZE deletes per HTTP
+        request through the GCS batch endpoint instead of one request each.
+
+        As with delete(), missing objects are not an error; per-object
+        failures inside a batch are not raised.
+        """
+        names = [self._normalize_name(clean_name(name)) for name in names]
+        for start in range(0, len(names), BATCH_SIZE):
+            with self.client.batch(raise_exception=False):
+                for name in names[start:start + BATCH_SIZE]:
+                    self.bucket.delete_blob(name)
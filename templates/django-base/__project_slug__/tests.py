@@ -120,3 +120,77 @@ class S3ReadWriteTests(TestCase):
             if saved_key and default_storage.exists(saved_key):
                 default_storage.delete(saved_key)
 
+
+class PublicGoogleCloudStorageTests(TestCase):
+    def test_public_url_is_built_without_a_client(self):
+        """Public media URLs are formatted locally, matching blob.public_url."""
+        from .storage import PublicGoogleCloudStorage
+
+        storage = PublicGoogleCloudStorage(bucket_name="media-bucket", querystring_auth=False)
+        self.assertEqual(
+            storage.url("avatars/jane doe.png"),
+            "https://storage.googleapis.com/media-bucket/avatars/jane%20doe.png",
+        )
+        self.assertIsNone(storage._client)
+
+    def test_custom_endpoint_is_respected(self):
+        from .storage import PublicGoogleCloudStorage
+
+        storage = PublicGoogleCloudStorage(
+            bucket_name="media-bucket",
+            querystring_auth=False,
+            custom_endpoint="https://cdn.example.com",
+        )
+        self.assertEqual(storage.url("a/b.jpg"), "https://cdn.example.com/a/b.jpg")
+
+    def test_location_is_applied_once(self):
+        """Both public and signed URLs prefix the object name with location once."""
+        from unittest import mock
+        from .storage import PublicGoogleCloudStorage
+
+        storage = PublicGoogleCloudStorage(bucket_name="media-bucket", querystring_auth=False, location="media")
+        self.assertEqual(storage.url("a.jpg"), "https://storage.googleapis.com/media-bucket/media/a.jpg")
+
+        storage = PublicGoogleCloudStorage(bucket_name="media-bucket", querystring_auth=True, location="media")
+        with mock.patch.object(PublicGoogleCloudStorage, "bucket") as bucket:
+            bucket.blob.return_value.generate_signed_url.return_value = "https://signed"
+            self.assertEqual(storage.url("a.jpg"), "https://signed")
+        bucket.blob.assert_called_once_with("media/a.jpg")
+
+    def test_instances_share_one_client(self):
+        """Storage instances reuse a single client and HTTP session."""
+        from google.auth.credentials import AnonymousCredentials
+        from .storage import PublicGoogleCloudStorage
+
+        credentials = AnonymousCredentials()
+        first = PublicGoogleCloudStorage(bucket_name="a", project_id="p", credentials=credentials)
+        second = PublicGoogleCloudStorage(bucket_name="b", project_id="p", credentials=credentials)
+        self.assertIs(first.client, second.client)
+
+    def test_delete_many_batches_and_ignores_missing_objects(self):
+        """delete_many() sends up to 100 deletes per batch and skips missing objects."""
+        import requests
+        from unittest import mock
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud.storage.batch import Batch
+        from .storage import PublicGoogleCloudStorage
+
+        storage = PublicGoogleCloudStorage(bucket_name="media-bucket", project_id="p",
+                                           credentials=AnonymousCredentials())
+        batch_sizes = []
+
+        def finish(batch, raise_exception=True):
+            batch_sizes.append(len(batch._requests))
+            responses = []
+            for _ in batch._requests:
+                response = requests.Response()
+                response.status_code = 204
+                responses.append(response)
+            responses[0].status_code = 404  # already deleted
+            batch._finish_futures(responses, raise_exception=raise_exception)
+            return responses
+
+        with mock.patch.object(Batch, "finish", autospec=True, side_effect=finish):
+            storage.delete_many([f"photos/{i}.jpg" for i in range(250)])
+
+        self.assertEqual(batch_sizes, [100, 100, 50])
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from dj_rest_auth.registration.serializers import RegisterSerializer
 
+# Resolved once at import; don't call get_user_model() inside request code
 User = get_user_model()
 
 
@@ -17,18 +18,10 @@ class EmailRegisterSerializer(RegisterSerializer):
     def get_cleaned_data(self):
         data = super().get_cleaned_data()
         full_name = self.validated_data.get('full_name', '').strip()
-        first_name = ''
-        last_name = ''
-        if full_name:
-            parts = full_name.split()
-            if len(parts) == 1:
-                first_name = parts[0]
-            else:
-                first_name = parts[0]
-                last_name = ' '.join(parts[1:])
+        first_name, *other_names = full_name.split() or ['']
         data.update({
             'first_name': first_name,
-            'last_name': last_name,
+            'last_name': ' '.join(other_names),
         })
         return data
 
@@ -102,5 +95,5 @@ class ChangePasswordSerializer(serializers.Serializer):
     def save(self):
         user = self.context['request'].user
         user.set_password(self.validated_data['new_password1'])
-        user.save()
+        user.save(update_fields=['password'])
         return user
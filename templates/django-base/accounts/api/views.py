@@ -2,11 +2,14 @@ from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from rest_framework.authtoken.models import Token
 
-from .serializers import UserProfileSerializer, ChangePasswordSerializer
+from .serializers import ChangePasswordSerializer
 
+# Resolved once at import; don't call get_user_model() inside request code
 User = get_user_model()
 
 
@@ -19,9 +22,21 @@ class UserProfileView(APIView):
     def get(self, request):
         """
         Return the current user's profile.
+
+        Built from the already-authenticated request.user rather than
+        UserProfileSerializer: the payload is fixed and read-only, so there
+        is nothing to validate and no reason to re-query the row.
         """
-        serializer = UserProfileSerializer(request.user)
-        return Response(serializer.data)
+        user = request.user
+        return Response({
+            'pk': user.pk,
+            'email': user.email,
+            'full_name': user.full_name,
+            'preferred_name': user.preferred_name,
+            'date_joined': user.date_joined,
+            'last_login': user.last_login,
+            'is_active': user.is_active,
+        })
 
 
 class ChangePasswordView(APIView):
@@ -65,10 +80,21 @@ def simple_register(request):
     if password1 != password2:
         return Response({'password2': ['The two password fields didn\'t match.']}, status=status.HTTP_400_BAD_REQUEST)
 
-    if User.objects.filter(email=email).exists():
+    # Let the unique index on email reject duplicates instead of checking first
+    try:
+        with transaction.atomic():
+            user = User.objects.create_user(email=email, password=password1)
+    except IntegrityError:
         return Response({'email': ['A user with this email already exists.']}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = User.objects.create_user(email=email, password=password1)
+    if settings.REST_USE_JWT:
+        from rest_framework_simplejwt.tokens import RefreshToken
+        refresh = RefreshToken.for_user(user)
+        return Response(
+            {'access': str(refresh.access_token), 'refresh': str(refresh)},
+            status=status.HTTP_201_CREATED
+        )
+
     token, _ = Token.objects.get_or_create(user=user)
     return Response({'key': token.key}, status=status.HTTP_201_CREATED)
 
@@ -1,27 +1,52 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import MD5PasswordHasher, make_password
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 import json
+from types import MappingProxyType
 
 User = get_user_model()
 
+# Password strength is not under test; MD5 keeps hashing out of the test runtime
+FAST_PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
 
+# Hashed once; fixtures store it directly instead of running the hasher per user
+HASHED_PASSWORD = make_password('testpassword123', hasher=MD5PasswordHasher())
+
+# Resolved once at import; the test runner sets Django up before loading this module
+PROFILE_URL = reverse('accounts:user-profile')
+STATS_URL = reverse('accounts:user-stats')
+CHANGE_PASSWORD_URL = reverse('accounts:change-password')
+
+AUTH_URLS = {
+    'registration': '/api/accounts/auth/registration/',  # Back to dj-rest-auth
+    'login': '/api/accounts/auth/login/',
+    'logout': '/api/accounts/auth/logout/',
+    'user': '/api/accounts/auth/user/',
+}
+
+
+@override_settings(PASSWORD_HASHERS=FAST_PASSWORD_HASHERS)
 class UserRegistrationTestCase(APITestCase):
     """
     Test cases for user registration functionality.
     """
 
+    # Read-only, class-level fixtures; tests build a new dict to vary them
+    VALID_USER_DATA = MappingProxyType({
+        'email': 'testuser@example.com',
+        'password1': 'testpassword123',
+        'password2': 'testpassword123',
+    })
+    # Encoded once and posted as-is, skipping the JSON renderer on every request
+    VALID_USER_BODY = json.dumps(dict(VALID_USER_DATA))
+
     def setUp(self):
         self.client = APIClient()
-        self.registration_url = '/api/accounts/auth/registration/'  # Back to dj-rest-auth
-        self.valid_user_data = {
-            'email': 'testuser@example.com',
-            'password1': 'testpassword123',
-            'password2': 'testpassword123',
-        }
+        self.registration_url = AUTH_URLS['registration']
 
     def test_user_registration_success(self):
         """
@@ -29,8 +54,8 @@ class UserRegistrationTestCase(APITestCase):
         """
         response = self.client.post(
             self.registration_url,
-            self.valid_user_data,
-            format='json'
+            self.VALID_USER_BODY,
+            content_type='application/json'
         )
 
         # Debug: print response if test fails
@@ -42,15 +67,33 @@ class UserRegistrationTestCase(APITestCase):
         self.assertIn('key', response.data)  # Token should be returned
 
         # Verify user was created
-        user = User.objects.get(email=self.valid_user_data['email'])
+        user = User.objects.get(email=self.VALID_USER_DATA['email'])
         self.assertTrue(user.is_active)  # User is active since email verification is optional
 
+    @override_settings(REST_USE_JWT=True)
+    def test_user_registration_returns_jwt_when_enabled(self):
+        """
+        Test registration issues a JWT pair instead of a stored token in JWT mode.
+        """
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        response = self.client.post(
+            self.registration_url,
+            self.VALID_USER_BODY,
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('refresh', response.data)
+        user = User.objects.get(email=self.VALID_USER_DATA['email'])
+        self.assertEqual(str(AccessToken(response.data['access'])['user_id']), str(user.pk))
+        self.assertFalse(Token.objects.filter(user=user).exists())
+
     def test_user_registration_password_mismatch(self):
         """
         Test registration with mismatched passwords.
         """
-        invalid_data = self.valid_user_data.copy()
-        invalid_data['password2'] = 'differentpassword'
+        invalid_data = {**self.VALID_USER_DATA, 'password2': 'differentpassword'}
 
         response = self.client.post(
             self.registration_url,
@@ -67,15 +110,12 @@ class UserRegistrationTestCase(APITestCase):
         Test registration with duplicate email.
         """
         # Create a user first with the same email
-        User.objects.create_user(
-            email='testuser@example.com',
-            password='password123'
-        )
+        User.objects.create(email='testuser@example.com', password=HASHED_PASSWORD)
 
         response = self.client.post(
             self.registration_url,
-            self.valid_user_data,
-            format='json'
+            self.VALID_USER_BODY,
+            content_type='application/json'
         )
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -102,28 +142,31 @@ class UserRegistrationTestCase(APITestCase):
         self.assertIn('password2', response.data)
 
 
+@override_settings(PASSWORD_HASHERS=FAST_PASSWORD_HASHERS)
 class UserLoginTestCase(APITestCase):
     """
     Test cases for user login functionality.
     """
 
-    def setUp(self):
-        self.client = APIClient()
-        self.login_url = '/api/accounts/auth/login/'
-        self.logout_url = '/api/accounts/auth/logout/'
+    USER_CREDENTIALS_BODY = json.dumps({
+        'email': 'testuser@example.com',
+        'password': 'testpassword123'
+    })
 
+    @classmethod
+    def setUpTestData(cls):
         # Create an active user for testing
-        self.user = User.objects.create_user(
+        cls.user = User.objects.create(
             email='testuser@example.com',
-            password='testpassword123',
+            password=HASHED_PASSWORD,
+            full_name='Test User',
+            preferred_name='Test',
         )
-        self.user.full_name = 'Test User'
-        self.user.preferred_name = 'Test'
-        self.user.save()
-        self.user_credentials = {
-            'email': 'testuser@example.com',
-            'password': 'testpassword123'
-        }
+
+    def setUp(self):
+        self.client = APIClient()
+        self.login_url = AUTH_URLS['login']
+        self.logout_url = AUTH_URLS['logout']
 
     def test_user_login_success(self):
         """
@@ -131,8 +174,8 @@ class UserLoginTestCase(APITestCase):
         """
         response = self.client.post(
             self.login_url,
-            self.user_credentials,
-            format='json'
+            self.USER_CREDENTIALS_BODY,
+            content_type='application/json'
         )
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -166,13 +209,12 @@ class UserLoginTestCase(APITestCase):
         Test login with inactive user account.
         """
         # Create inactive user
-        inactive_user = User.objects.create_user(
+        User.objects.create(
             email='inactive@example.com',
-            password='testpassword123',
+            password=HASHED_PASSWORD,
+            full_name='Inactive User',
+            is_active=False,
         )
-        inactive_user.full_name = 'Inactive User'
-        inactive_user.is_active = False
-        inactive_user.save()
 
         credentials = {
             'email': 'inactive@example.com',
@@ -194,8 +236,8 @@ class UserLoginTestCase(APITestCase):
         # First login to get a token
         login_response = self.client.post(
             self.login_url,
-            self.user_credentials,
-            format='json'
+            self.USER_CREDENTIALS_BODY,
+            content_type='application/json'
         )
         self.assertEqual(login_response.status_code, status.HTTP_200_OK)
 
@@ -223,21 +265,24 @@ class UserLoginTestCase(APITestCase):
         self.assertIn(response.status_code, [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST, status.HTTP_401_UNAUTHORIZED])
 
 
+@override_settings(PASSWORD_HASHERS=FAST_PASSWORD_HASHERS)
 class TokenAuthenticationTestCase(APITestCase):
     """
     Test cases for token-based authentication.
     """
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
             email='testuser@example.com',
-            password='testpassword123',
+            password=HASHED_PASSWORD,
+            full_name='Test User',
         )
-        self.user.full_name = 'Test User'
-        self.user.save()
-        self.token = Token.objects.create(user=self.user)
-        self.user_detail_url = '/api/accounts/auth/user/'
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user_detail_url = AUTH_URLS['user']
 
     def test_authenticated_request_with_valid_token(self):
         """
@@ -273,7 +318,7 @@ class TokenAuthenticationTestCase(APITestCase):
         """
         Test updating user details with valid authentication.
         """
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.force_authenticate(user=self.user)
 
         update_data = {
             'first_name': 'Updated',
@@ -291,42 +336,57 @@ class TokenAuthenticationTestCase(APITestCase):
         self.assertEqual(response.data['last_name'], 'Name')
 
         # Verify database was updated
-        self.user.refresh_from_db()
-        self.assertEqual(self.user.first_name, 'Updated')
-        self.assertEqual(self.user.last_name, 'Name')
+        names = User.objects.values_list('first_name', 'last_name').get(pk=self.user.pk)
+        self.assertEqual(names, ('Updated', 'Name'))
 
 
+@override_settings(PASSWORD_HASHERS=FAST_PASSWORD_HASHERS)
 class UserProfileViewTestCase(APITestCase):
     """
     Test cases for custom user profile views.
     """
 
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
             email='testuser@example.com',
-            password='testpassword123',
+            password=HASHED_PASSWORD,
+            full_name='Test User',
         )
-        self.user.full_name = 'Test User'
-        self.user.save()
-        self.token = Token.objects.create(user=self.user)
-        self.profile_url = reverse('accounts:user-profile')
-        self.stats_url = reverse('accounts:user-stats')
-        self.change_password_url = reverse('accounts:change-password')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.profile_url = PROFILE_URL
+        self.stats_url = STATS_URL
+        self.change_password_url = CHANGE_PASSWORD_URL
 
     def test_get_user_profile_authenticated(self):
         """
         Test retrieving user profile with authentication.
         """
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.force_authenticate(user=self.user)
 
-        response = self.client.get(self.profile_url)
+        # The view builds its response from request.user and must not query
+        with self.assertNumQueries(0):
+            response = self.client.get(self.profile_url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['email'], self.user.email)
         self.assertEqual(response.data['full_name'], 'Test User')
         self.assertIn('date_joined', response.data)
 
+    def test_get_user_profile_matches_serializer_fields(self):
+        """
+        Test the hand-built profile payload keeps UserProfileSerializer's shape.
+        """
+        from .api.serializers import UserProfileSerializer
+
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(self.profile_url)
+
+        self.assertEqual(set(response.data), set(UserProfileSerializer().fields))
+
     def test_get_user_profile_unauthenticated(self):
         """
         Test retrieving user profile without authentication.
@@ -339,20 +399,34 @@ class UserProfileViewTestCase(APITestCase):
         """
         Test retrieving user stats with authentication.
         """
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.force_authenticate(user=self.user)
 
-        response = self.client.get(self.stats_url)
+        # The view builds its response from request.user and must not query
+        with self.assertNumQueries(0):
+            response = self.client.get(self.stats_url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['user_id'], self.user.pk)
         self.assertEqual(response.data['email'], self.user.email)
         self.assertEqual(response.data['is_active'], True)
 
+    def test_token_authenticated_stats_request_costs_one_query(self):
+        """
+        Test a token-authenticated request only runs the token lookup.
+        """
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.stats_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_change_password_success(self):
         """
         Test successful password change.
         """
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.force_authenticate(user=self.user)
 
         password_data = {
             'old_password': 'testpassword123',
@@ -370,14 +444,14 @@ class UserProfileViewTestCase(APITestCase):
         self.assertIn('message', response.data)
 
         # Verify password was changed
-        self.user.refresh_from_db()
-        self.assertTrue(self.user.check_password('newpassword456'))
+        user = User.objects.only('password').get(pk=self.user.pk)
+        self.assertTrue(user.check_password('newpassword456'))
 
     def test_change_password_wrong_old_password(self):
         """
         Test password change with wrong old password.
         """
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.force_authenticate(user=self.user)
 
         password_data = {
             'old_password': 'wrongpassword',
@@ -398,7 +472,7 @@ class UserProfileViewTestCase(APITestCase):
         """
         Test password change with mismatched new passwords.
         """
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.force_authenticate(user=self.user)
 
         password_data = {
             'old_password': 'testpassword123',
@@ -416,18 +490,19 @@ class UserProfileViewTestCase(APITestCase):
         self.assertIn('non_field_errors', response.data)
 
 
+@override_settings(PASSWORD_HASHERS=FAST_PASSWORD_HASHERS)
 class SerializerTestCase(APITestCase):
     """
     Test cases for custom serializers.
     """
 
-    def setUp(self):
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
             email='testuser@example.com',
-            password='testpassword123',
+            password=HASHED_PASSWORD,
+            full_name='Test User',
         )
-        self.user.full_name = 'Test User'
-        self.user.save()
 
     def test_custom_register_serializer_validation(self):
         """
@@ -450,6 +525,24 @@ class SerializerTestCase(APITestCase):
         self.assertEqual(cleaned_data['first_name'], 'New')
         self.assertEqual(cleaned_data['last_name'], 'User')
 
+    def test_custom_register_serializer_splits_name_on_any_whitespace(self):
+        """
+        Test full_name is split on runs of any whitespace, as str.split() does.
+        """
+        from .api.serializers import CustomRegisterSerializer
+
+        serializer = CustomRegisterSerializer(data={
+            'email': 'newuser@example.com',
+            'password1': 'newpassword123',
+            'password2': 'newpassword123',
+            'full_name': 'New\tMiddle   User',
+        })
+        self.assertTrue(serializer.is_valid())
+
+        cleaned_data = serializer.get_cleaned_data()
+        self.assertEqual(cleaned_data['first_name'], 'New')
+        self.assertEqual(cleaned_data['last_name'], 'Middle User')
+
     def test_user_details_serializer_email_validation(self):
         """
         Test user details serializer email uniqueness validation.
@@ -459,10 +552,7 @@ class SerializerTestCase(APITestCase):
         from rest_framework.request import Request
 
         # Create another user with different email
-        other_user = User.objects.create_user(
-            email='other@example.com',
-            password='password123'
-        )
+        other_user = User.objects.create(email='other@example.com', password=HASHED_PASSWORD)
 
         # Create a mock request
         factory = RequestFactory()
@@ -485,13 +575,8 @@ class SerializerTestCase(APITestCase):
         """
         Test change password serializer validation using the actual API endpoint.
         """
-        from rest_framework.authtoken.models import Token
-
-        # Create a token for the user
-        token = Token.objects.create(user=self.user)
-
         # Test with correct old password via API
-        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.force_authenticate(user=self.user)
 
         valid_data = {
             'old_password': 'testpassword123',
@@ -499,12 +584,12 @@ class SerializerTestCase(APITestCase):
             'new_password2': 'newpassword456'
         }
 
-        response = self.client.post('/api/accounts/change-password/', valid_data, format='json')
+        response = self.client.post(CHANGE_PASSWORD_URL, valid_data, format='json')
         self.assertEqual(response.status_code, 200)
 
         # Verify password was changed
-        self.user.refresh_from_db()
-        self.assertTrue(self.user.check_password('newpassword456'))
+        user = User.objects.only('password').get(pk=self.user.pk)
+        self.assertTrue(user.check_password('newpassword456'))
 
         # Test with incorrect old password
         invalid_data = {
@@ -513,6 +598,29 @@ class SerializerTestCase(APITestCase):
             'new_password2': 'anotherpassword789'
         }
 
-        response = self.client.post('/api/accounts/change-password/', invalid_data, format='json')
+        response = self.client.post(CHANGE_PASSWORD_URL, invalid_data, format='json')
         self.assertEqual(response.status_code, 400)
         self.assertIn('old_password', response.data)
+
+
+class UserModelLookupTestCase(SimpleTestCase):
+    """
+    Guard against get_user_model() creeping back into request-time code.
+    """
+
+    def test_get_user_model_only_called_at_module_level(self):
+        """
+        Test the API modules resolve the user model once, at import.
+        """
+        import ast
+        import inspect
+        from .api import serializers, views
+
+        for module in (views, serializers):
+            tree = ast.parse(inspect.getsource(module))
+            for func in ast.walk(tree):
+                if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    continue
+                for node in ast.walk(func):
+                    if isinstance(node, ast.Call) and getattr(node.func, 'id', None) == 'get_user_model':
+                        self.fail(f"{module.__name__}.{func.name} calls get_user_model(); use the module-level User")
@@ -9,6 +9,7 @@ Usage:
     # Day-to-day operations
     fab deploy              # Deploy to production
     fab deploy --env=staging  # Deploy to staging
+    fab deploy-config       # Update env vars/scaling only, no image rebuild
     fab build               # Build Docker image only
     fab migrate             # Run migrations on Cloud Run
     fab logs                # View Cloud Run logs
@@ -17,6 +18,10 @@ Usage:
     fab db-export           # Export database to GCS
     fab db-import           # Import database from GCS
 
+Authentication:
+    gcloud auth login                          # for the gcloud commands
+    gcloud auth application-default login      # for setup's API calls (buckets, secrets)
+
 Configuration:
     Set these environment variables or create a .env file:
     - GCP_PROJECT_ID: Your GCP project ID
@@ -24,12 +29,23 @@ Configuration:
     - CLOUD_SQL_INSTANCE: Cloud SQL instance name
     - CLOUD_SQL_PROJECT: Project containing Cloud SQL (if different)
     - GCP_BILLING_ACCOUNT: Billing account for setup (optional, can pass as arg)
+    - FAB_LOG_LEVEL: Verbosity of task messages (default: INFO)
 """
+import io
+import json
+import logging
 import os
+import re
 import secrets
 import string
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
 from fabric import task
-from invoke import Context
+from invoke import Context, Exit, UnexpectedExit
 
 # Load environment variables
 try:
@@ -47,6 +63,13 @@ SERVICE_NAME = os.getenv("SERVICE_NAME", "{{ project_slug }}")
 GCP_BILLING_ACCOUNT = os.getenv("GCP_BILLING_ACCOUNT", "00139C-8D2D10-3919FA")
 GCP_ORGANIZATION_ID = os.getenv("GCP_ORGANIZATION_ID", "")
 
+# Split large uploads into parallel composite uploads in the `gcloud storage`
+# commands below. Set through the environment so only processes started from
+# here see it and the user's gcloud configuration is never modified.
+os.environ.setdefault("CLOUDSDK_STORAGE_PARALLEL_COMPOSITE_UPLOAD_ENABLED", "True")
+os.environ.setdefault("CLOUDSDK_STORAGE_PARALLEL_COMPOSITE_UPLOAD_COMPATIBILITY_CHECK", "False")
+os.environ.setdefault("CLOUDSDK_STORAGE_PARALLEL_COMPOSITE_UPLOAD_THRESHOLD", "50M")
+
 # Colors for output
 GREEN = "\033[0;32m"
 YELLOW = "\033[1;33m"
@@ -54,29 +77,52 @@ RED = "\033[0;31m"
 NC = "\033[0m"
 
 
-def log_info(msg):
-    print(f"{GREEN}[INFO]{NC} {msg}")
+class LevelColorFilter(logging.Filter):
+    """Attach the colour and short tag for each record's level."""
 
+    STYLES = {
+        logging.INFO: (GREEN, "INFO"),
+        logging.WARNING: (YELLOW, "WARN"),
+        logging.ERROR: (RED, "ERROR"),
+    }
 
-def log_warn(msg):
-    print(f"{YELLOW}[WARN]{NC} {msg}")
+    def filter(self, record):
+        record.color, record.tag = self.STYLES.get(record.levelno, (NC, record.levelname))
+        return True
 
 
-def log_error(msg):
-    print(f"{RED}[ERROR]{NC} {msg}")
+# Log to stdout so messages stay in order with task output; FAB_LOG_LEVEL=WARNING quietens it
+logger = logging.getLogger("fab")
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter(f"%(color)s[%(tag)s]{NC} %(message)s"))
+_handler.addFilter(LevelColorFilter())
+logger.addHandler(_handler)
+logger.setLevel(os.getenv("FAB_LOG_LEVEL", "INFO").upper())
+logger.propagate = False
 
 
 def generate_password(length=30):
     """Generate a secure random password."""
     alphabet = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
-
-
-def get_env_config(env: str) -> dict:
-    """Get configuration for the specified environment."""
+    # Draw random bytes in bulk, discarding those past the last whole multiple
+    # of len(alphabet) so the modulo mapping stays unbiased
+    limit = 256 - 256 % len(alphabet)
+    password = ''
+    while len(password) < length:
+        password += ''.join(alphabet[b % len(alphabet)]
+                            for b in secrets.token_bytes(length * 2) if b < limit)
+    return password[:length]
+
+
+@lru_cache(maxsize=4)
+def get_env_config(env: str) -> MappingProxyType:
+    """Get configuration for the specified environment (cached, read-only)."""
+    cloudsql = f"{CLOUD_SQL_PROJECT}:{GCP_REGION}:{CLOUD_SQL_INSTANCE}"
     configs = {
         "production": {
             "service": SERVICE_NAME,
+            "image": f"gcr.io/{GCP_PROJECT_ID}/{SERVICE_NAME}",
+            "cloudsql": cloudsql,
             "settings": f"{SERVICE_NAME}.settings.cloud_production",
             "secrets_name": "application_settings",
             "min_instances": 0,
@@ -84,20 +130,63 @@ def get_env_config(env: str) -> dict:
         },
         "staging": {
             "service": f"{SERVICE_NAME}-staging",
+            "image": f"gcr.io/{GCP_PROJECT_ID}/{SERVICE_NAME}-staging",
+            "cloudsql": cloudsql,
             "settings": f"{SERVICE_NAME}.settings.cloud_staging",
             "secrets_name": "application_settings_staging",
             "min_instances": 0,
             "max_instances": 2,
         },
     }
-    return configs.get(env, configs["production"])
+    return MappingProxyType(configs.get(env, configs["production"]))
+
+
+# The SDK clients below share one set of credentials and one pooled HTTP
+# session, so a run mints a single access token and reuses its TLS connections
+@lru_cache(maxsize=None)
+def default_credentials():
+    """Application Default Credentials, loaded once per run."""
+    import google.auth
+    from google.auth.exceptions import DefaultCredentialsError
+    try:
+        credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    except DefaultCredentialsError:
+        raise Exit("No Application Default Credentials found. "
+                   "Run `gcloud auth application-default login` and try again.", code=1)
+    return credentials
+
+
+@lru_cache(maxsize=None)
+def authorized_session():
+    """Pooled HTTP session carrying the default credentials."""
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+    session = AuthorizedSession(default_credentials())
+    # Room for every setup thread without queueing on the pool
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+    return session
+
+
+@lru_cache(maxsize=None)
+def secret_manager_client():
+    """Secret Manager client, created once per run."""
+    from google.cloud import secretmanager
+    return secretmanager.SecretManagerServiceClient(credentials=default_credentials())
+
+
+@lru_cache(maxsize=None)
+def storage_client(project):
+    """Cloud Storage client for a project, created once per run."""
+    from google.cloud import storage
+    return storage.Client(project=project, credentials=default_credentials(),
+                          _http=authorized_session())
 
 
 @task
 def build(c, env="production"):
     """Build Docker image using Cloud Build."""
     config = get_env_config(env)
-    image = f"gcr.io/{GCP_PROJECT_ID}/{config['service']}"
+    image = config["image"]
 
     print(f"Building image with Cloud Build: {image}")
     c.run(f"""gcloud builds submit \\
@@ -108,14 +197,31 @@ def build(c, env="production"):
 
 
 @task
-def deploy(c, env="production"):
-    """Build and deploy to Cloud Run."""
+def deploy(c, env="production", skip_build=False):
+    """Build and deploy to Cloud Run.
+
+    Pass --skip-build to only push configuration changes (see deploy-config).
+    """
+    if skip_build:
+        deploy_config(c, env=env)
+        return
+
     config = get_env_config(env)
-    image = f"gcr.io/{GCP_PROJECT_ID}/{config['service']}"
+    image = config["image"]
+
+    # Check the Cloud SQL instance exists while the image builds
+    sql_check = c.run(f"gcloud sql instances describe {CLOUD_SQL_INSTANCE} "
+                      f"--project {CLOUD_SQL_PROJECT} --format 'value(name)'",
+                      asynchronous=True, in_stream=False, warn=True, hide=True)
 
     # Build and push
     build(c, env=env)
 
+    result = sql_check.join()
+    if result.failed:
+        raise Exit(f"Cloud SQL instance {CLOUD_SQL_INSTANCE} in {CLOUD_SQL_PROJECT} "
+                   f"is not usable: {result.stderr.strip()}", code=1)
+
     # Deploy to Cloud Run
     print(f"Deploying to Cloud Run: {config['service']}")
     cmd = f"""gcloud run deploy {config['service']} \\
@@ -123,7 +229,7 @@ def deploy(c, env="production"):
         --platform managed \\
         --region {GCP_REGION} \\
         --project {GCP_PROJECT_ID} \\
-        --add-cloudsql-instances {CLOUD_SQL_PROJECT}:{GCP_REGION}:{CLOUD_SQL_INSTANCE} \\
+        --add-cloudsql-instances {config['cloudsql']} \\
         --set-env-vars DJANGO_SETTINGS_MODULE={config['settings']},GCP_PROJECT_ID={GCP_PROJECT_ID} \\
         --min-instances {config['min_instances']} \\
         --max-instances {config['max_instances']} \\
@@ -132,6 +238,23 @@ def deploy(c, env="production"):
     print(f"Deployed: {config['service']}")
 
 
+@task(name="deploy-config")
+def deploy_config(c, env="production"):
+    """Update Cloud Run env vars, scaling and Cloud SQL without rebuilding the image."""
+    config = get_env_config(env)
+
+    print(f"Updating Cloud Run configuration: {config['service']}")
+    c.run(f"""gcloud run services update {config['service']} \\
+        --platform managed \\
+        --region {GCP_REGION} \\
+        --project {GCP_PROJECT_ID} \\
+        --add-cloudsql-instances {config['cloudsql']} \\
+        --set-env-vars DJANGO_SETTINGS_MODULE={config['settings']},GCP_PROJECT_ID={GCP_PROJECT_ID} \\
+        --min-instances {config['min_instances']} \\
+        --max-instances {config['max_instances']}""", pty=True)
+    print(f"Updated: {config['service']}")
+
+
 @task
 def migrate(c, env="production"):
     """Run Django migrations via Cloud Build."""
@@ -162,15 +285,15 @@ def createsuperuser(c, email, password, env="production"):
 
     print(f"Creating superuser {email} for {env}...")
 
-    # Create a temporary cloudbuild config for createsuperuser
+    # Cloud Build config for createsuperuser, fed to gcloud on stdin
     cloudbuild_config = f"""
 steps:
   - name: 'gcr.io/google-appengine/exec-wrapper'
     args:
       - '-i'
-      - 'gcr.io/{GCP_PROJECT_ID}/{config["service"]}'
+      - '{config["image"]}'
       - '-s'
-      - '{CLOUD_SQL_PROJECT}:{GCP_REGION}:{CLOUD_SQL_INSTANCE}'
+      - '{config["cloudsql"]}'
       - '-e'
       - 'DJANGO_SETTINGS_MODULE={config["settings"]}'
       - '-e'
@@ -184,21 +307,14 @@ steps:
       - '--noinput'
 timeout: '600s'
 """
-    
-    import tempfile
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-        f.write(cloudbuild_config)
-        config_file = f.name
-    
-    try:
-        c.run(f"""gcloud builds submit \\
-            --config {config_file} \\
-            --project {GCP_PROJECT_ID} \\
-            --no-source \\
-            --timeout=10m""", pty=True)
-        print(f"Superuser {email} created successfully!")
-    finally:
-        os.unlink(config_file)
+
+    # Streamed rather than written to a tempfile so the password never lands on disk
+    c.run(f"""gcloud builds submit \\
+        --config /dev/stdin \\
+        --project {GCP_PROJECT_ID} \\
+        --no-source \\
+        --timeout=10m""", in_stream=io.StringIO(cloudbuild_config))
+    print(f"Superuser {email} created successfully!")
 
 
 @task(name="secrets-download")
@@ -262,10 +378,9 @@ def db_download(c, database=None):
     # Export to GCS
     db_export(c, database=db)
 
-    # Download locally
+    # Download and decompress in one stream, without a .gz copy on disk
     print(f"Downloading gs://{bucket}/{db}.gz...")
-    c.run(f"gsutil cp gs://{bucket}/{db}.gz .")
-    c.run(f"gunzip -f {db}.gz")
+    c.run(f"gcloud storage cp gs://{bucket}/{db}.gz - | gunzip > {db}", pty=True)
     print(f"Database saved to {db}")
 
 
@@ -274,7 +389,9 @@ def media_download(c, bucket=None):
     """Download media files from GCS."""
     bucket = bucket or GCP_PROJECT_ID
     print(f"Downloading media from gs://{bucket}/media...")
-    c.run(f"gsutil -m cp -r gs://{bucket}/media .", pty=True)
+    # rsync only fetches objects whose checksum differs from the local copy
+    c.run("mkdir -p media")
+    c.run(f"gcloud storage rsync --recursive --checksums-only gs://{bucket}/media media", pty=True)
 
 
 @task(name="media-upload")
@@ -282,8 +399,10 @@ def media_upload(c, bucket=None):
     """Upload media files to GCS."""
     bucket = bucket or GCP_PROJECT_ID
     print(f"Uploading media to gs://{bucket}/media...")
-    c.run(f"gsutil -m cp -r media gs://{bucket}/", pty=True)
-    c.run(f"gsutil -m acl set -R -a public-read gs://{bucket}/media", pty=True)
+    # Only changed files are sent; text assets are gzipped on the wire and
+    # the ACL is set as each object is written rather than in a second pass
+    c.run(f"gcloud storage rsync --recursive --checksums-only --gzip-in-flight=html,css,js,svg "
+          f"--predefined-acl=publicRead media gs://{bucket}/media", pty=True)
 
 
 @task
@@ -341,16 +460,20 @@ def setup(c, project, billing=None, staging=False, region=None, sql_instance=Non
     org_id = GCP_ORGANIZATION_ID
 
     if not billing_account:
-        log_error("Billing account is required.")
+        logger.error("Billing account is required.")
         print("Pass --billing=XXXXXX-XXXXXX-XXXXXX or set GCP_BILLING_ACCOUNT env var")
         return
 
+    # The bucket and secrets steps call the APIs directly; check they can
+    # authenticate before anything is created
+    default_credentials()
+
     secrets_name = "application_settings_staging" if staging else "application_settings"
     bucket_name = project
 
-    log_info(f"Setting up GCP project: {project}")
-    log_info(f"Region: {region}")
-    log_info(f"Staging: {staging}")
+    logger.info(f"Setting up GCP project: {project}")
+    logger.info(f"Region: {region}")
+    logger.info(f"Staging: {staging}")
     print()
 
     # Create or select project
@@ -359,30 +482,42 @@ def setup(c, project, billing=None, staging=False, region=None, sql_instance=Non
     # Link billing
     setup_link_billing(c, project, billing_account)
 
+    # Generate credentials before any remote work starts, so the steps below
+    # only wait on gcloud and the APIs
+    db_password = generate_password()
+    secret_key = generate_password(50)
+
     # Enable APIs
     setup_enable_apis(c, project)
 
-    # Get service account emails
-    cloudrun_sa, cloudbuild_sa = setup_get_service_accounts(c, project)
-
-    # IAM permissions
-    setup_iam_permissions(c, project, cloudrun_sa, cloudbuild_sa, sql_project)
-
-    # Create database
-    db_password = setup_create_database(c, project, sql_instance, sql_project)
-
-    # Create storage bucket
-    setup_create_bucket(c, project, bucket_name, region)
-
-    # Create secrets
-    setup_create_secrets(c, project, secrets_name, bucket_name, db_password,
-                         sql_project, region, sql_instance, cloudrun_sa, cloudbuild_sa)
+    # The remaining steps only depend on the APIs and on each other's outputs:
+    # service accounts, database and bucket run side by side, IAM starts once
+    # the service accounts are known and secrets once the database is ready.
+    # Commands running in parallel must not compete for the terminal's stdin.
+    c.config.run.in_stream = False
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        sa_future = executor.submit(setup_get_service_accounts, c, project)
+        db_future = executor.submit(setup_create_database, c, project, sql_instance,
+                                    sql_project, db_password)
+        bucket_future = executor.submit(setup_create_bucket, c, project, bucket_name, region)
+
+        cloudrun_sa, cloudbuild_sa = sa_future.result()
+        iam_future = executor.submit(setup_iam_permissions, c, project,
+                                     cloudrun_sa, cloudbuild_sa, sql_project)
+
+        db_future.result()
+        setup_create_secrets(c, project, secrets_name, bucket_name, db_password,
+                             sql_project, region, sql_instance, cloudrun_sa, cloudbuild_sa,
+                             secret_key)
+
+        iam_future.result()
+        bucket_future.result()
 
     # Summary
     print()
-    log_info("==========================================")
-    log_info("GCP Project Setup Complete!")
-    log_info("==========================================")
+    logger.info("==========================================")
+    logger.info("GCP Project Setup Complete!")
+    logger.info("==========================================")
     print()
     print(f"Project ID:     {project}")
     print(f"Region:         {region}")
@@ -398,34 +533,129 @@ def setup(c, project, billing=None, staging=False, region=None, sql_instance=Non
     print(f"  2. Deploy: fab deploy {env_flag}")
     print(f"  3. Run migrations: fab migrate {env_flag}")
     print()
-    log_info("Done!")
+    logger.info("Done!")
+
+
+# At most this many setup gcloud calls in flight, to stay under API rate limits
+_GCLOUD_SLOTS = threading.BoundedSemaphore(8)
+_THROTTLED = re.compile(r"RESOURCE_EXHAUSTED|Quota exceeded|\b429\b|\b503\b|UNAVAILABLE")
+_POLICY_CONFLICT = re.compile(r"ABORTED|\b409\b|concurrent policy changes")
+
+
+def gcloud(c, args, project, attempts=6, **kwargs):
+    """Run ``gcloud <args>`` against an explicit project.
+
+    Setup commands go through here so the project is always passed per call
+    and the shared gcloud configuration is never touched; concurrent setups
+    for different projects can then run side by side. Calls are capped by a
+    shared semaphore and retried with exponential backoff when throttled.
+    Asynchronous calls are passed straight through.
+    """
+    if "config set" in args:
+        raise ValueError("Setup must not change gcloud configuration; pass the project instead")
+    command = f'gcloud {args} --project "{project}"'
+    if kwargs.get("asynchronous"):
+        return c.run(command, **kwargs)
+
+    warn = kwargs.pop("warn", False)
+    stream = kwargs.get("in_stream")
+    for attempt in range(attempts):
+        if hasattr(stream, "seek"):
+            stream.seek(0)
+        with _GCLOUD_SLOTS:
+            result = c.run(command, warn=True, **kwargs)
+        if not result.failed or attempt == attempts - 1 or not _THROTTLED.search(result.stdout + result.stderr):
+            break
+        delay = min(2 ** attempt, 30)
+        # Only the command group is logged; arguments may hold passwords
+        logger.warning(f"gcloud {' '.join(args.split()[:2])} throttled, retrying in {delay}s...")
+        time.sleep(delay)
+
+    if result.failed and not warn:
+        raise UnexpectedExit(result)
+    return result
 
 
 def setup_create_project(c, project, org_id):
     """Create or select GCP project."""
-    log_info("Creating/selecting project...")
+    logger.info("Creating/selecting project...")
     try:
         if org_id:
-            c.run(f'gcloud projects create "{project}" --organization "{org_id}"',
-                  warn=True, hide=True)
+            gcloud(c, f'projects create "{project}" --organization "{org_id}"', project,
+                   warn=True, hide=True)
         else:
-            c.run(f'gcloud projects create "{project}"', warn=True, hide=True)
+            gcloud(c, f'projects create "{project}"', project, warn=True, hide=True)
     except Exception:
-        log_warn("Project already exists or creation failed, continuing...")
+        logger.warning("Project already exists or creation failed, continuing...")
 
 
 def setup_link_billing(c, project, billing_account):
     """Link billing account to project."""
-    log_info("Linking billing account...")
-    result = c.run(f'gcloud beta billing projects link "{project}" --billing-account "{billing_account}"',
-                   warn=True)
+    logger.info("Linking billing account...")
+    result = gcloud(c, f'beta billing projects link "{project}" --billing-account "{billing_account}"',
+                    project, warn=True)
     if result.failed:
-        log_error("Failed to link billing account")
+        logger.error("Failed to link billing account")
+
+
+SERVICE_USAGE_URL = "https://serviceusage.googleapis.com/v1"
+# Seconds to wait on any single Service Usage request, so a stalled
+# connection fails instead of hanging setup
+SERVICE_USAGE_TIMEOUT = 30
+
+
+def batch_enable_apis(c, project, apis, timeout=600):
+    """Enable APIs with a single Service Usage batchEnable call and wait for it."""
+    session = authorized_session()
+    response = session.post(
+        f"{SERVICE_USAGE_URL}/projects/{get_project_number(c, project)}/services:batchEnable",
+        json={"serviceIds": list(apis)},
+        timeout=SERVICE_USAGE_TIMEOUT,
+    )
+    response.raise_for_status()
+    operation = response.json()
+
+    deadline = time.monotonic() + timeout
+    while not operation.get("done"):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{operation['name']} still running after {timeout}s")
+        time.sleep(5)
+        response = session.get(f"{SERVICE_USAGE_URL}/{operation['name']}", timeout=SERVICE_USAGE_TIMEOUT)
+        response.raise_for_status()
+        operation = response.json()
+
+    if "error" in operation:
+        raise RuntimeError(operation["error"].get("message", operation["error"]))
+
+
+def enabled_apis(c, project):
+    """Get the names of the APIs already enabled on a project."""
+    try:
+        session = authorized_session()
+        url = f"{SERVICE_USAGE_URL}/projects/{get_project_number(c, project)}/services"
+        params = {"filter": "state:ENABLED", "pageSize": 200}
+        names = set()
+        while True:
+            response = session.get(url, params=params, timeout=SERVICE_USAGE_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            names.update(service["config"]["name"] for service in data.get("services", []))
+            if not data.get("nextPageToken"):
+                return names
+            params["pageToken"] = data["nextPageToken"]
+    except Exception:
+        result = gcloud(c, 'services list --enabled --format "value(config.name)"', project,
+                        warn=True, hide=True)
+        return set(result.stdout.split())
 
 
 def setup_enable_apis(c, project):
-    """Enable required Cloud APIs."""
-    log_info("Enabling Cloud APIs (this may take a few minutes)...")
+    """Enable required Cloud APIs.
+
+    Uses one batchEnable request when Application Default Credentials are
+    available, otherwise one concurrent gcloud call per API.
+    """
+    logger.info("Enabling Cloud APIs (this may take a few minutes)...")
     apis = [
         "run.googleapis.com",
         "sql-component.googleapis.com",
@@ -435,101 +665,185 @@ def setup_enable_apis(c, project):
         "secretmanager.googleapis.com",
         "storage.googleapis.com",
     ]
-    c.run(f'gcloud services --project "{project}" enable {" ".join(apis)}', pty=True)
 
+    # Re-runs usually find everything on already; only enable what's missing
+    enabled = enabled_apis(c, project)
+    apis = [api for api in apis if api not in enabled]
+    if not apis:
+        logger.info("All Cloud APIs already enabled")
+        return
+
+    try:
+        batch_enable_apis(c, project, apis)
+        return
+    except Exception as e:
+        logger.warning(f"Batch enable unavailable ({e}), enabling APIs with gcloud...")
+
+    def enable(api):
+        return gcloud(c, f'services enable {api}', project,
+                      warn=True, hide=True, in_stream=False)
+
+    # A single enable call works through the list one API at a time; in
+    # parallel the wait is bounded by the slowest API instead of the sum
+    with ThreadPoolExecutor(max_workers=len(apis)) as executor:
+        results = dict(zip(apis, executor.map(enable, apis)))
+
+    failed = [api for api, result in results.items() if result.failed]
+    for api in failed:
+        logger.error(f"Failed to enable {api}: {results[api].stderr.strip()}")
+    if failed:
+        raise Exit(f"Could not enable {len(failed)} API(s)", code=1)
 
-def setup_get_service_accounts(c, project):
+
+# Project numbers never change, so each is looked up at most once per run
+_PROJECT_NUMBERS = {}
+
+
+def get_project_number(c, project):
+    """Get the numeric ID of a project, asking gcloud only the first time."""
+    if project not in _PROJECT_NUMBERS:
+        result = gcloud(c, f'projects describe "{project}" --format "value(projectNumber)"',
+                        project, hide=True)
+        _PROJECT_NUMBERS[project] = result.stdout.strip()
+    return _PROJECT_NUMBERS[project]
+
+
+def setup_get_service_accounts(c, project, project_number=None):
     """Get service account emails for Cloud Run and Cloud Build."""
-    result = c.run(f'gcloud projects describe "{project}" --format "value(projectNumber)"',
-                   hide=True)
-    project_num = result.stdout.strip()
+    project_num = project_number or get_project_number(c, project)
     cloudrun_sa = f"{project_num}-compute@developer.gserviceaccount.com"
     cloudbuild_sa = f"{project_num}@cloudbuild.gserviceaccount.com"
-    log_info(f"Cloud Run SA: {cloudrun_sa}")
-    log_info(f"Cloud Build SA: {cloudbuild_sa}")
+    logger.info(f"Cloud Run SA: {cloudrun_sa}")
+    logger.info(f"Cloud Build SA: {cloudbuild_sa}")
     return cloudrun_sa, cloudbuild_sa
 
 
+def add_iam_bindings(c, group, name, project, bindings, attempts=5):
+    """Grant (role, member) pairs with one policy read and one write.
+
+    ``group`` is the gcloud command group (e.g. "projects", "secrets") and
+    ``name`` the resource within ``project``. The policy's etag goes back
+    with the write, so a concurrent change (common right after APIs are
+    enabled, while Google adds its service agents) is rejected; the policy
+    is then re-read, re-merged and written again with backoff.
+    """
+    for attempt in range(attempts):
+        result = gcloud(c, f'{group} get-iam-policy "{name}" --format json', project, hide=True)
+        policy = json.loads(result.stdout)
+
+        changed = False
+        for role, member in bindings:
+            binding = next((b for b in policy.setdefault("bindings", [])
+                            if b["role"] == role and "condition" not in b), None)
+            if binding is None:
+                binding = {"role": role, "members": []}
+                policy["bindings"].append(binding)
+            if member not in binding["members"]:
+                binding["members"].append(member)
+                changed = True
+
+        if not changed:
+            return
+        result = gcloud(c, f'{group} set-iam-policy "{name}" /dev/stdin --format none --quiet', project,
+                        in_stream=io.StringIO(json.dumps(policy)), warn=True, hide=True)
+        if not result.failed:
+            return
+        if attempt == attempts - 1 or not _POLICY_CONFLICT.search(result.stdout + result.stderr):
+            raise UnexpectedExit(result)
+        delay = min(2 ** attempt, 30)
+        logger.warning(f"IAM policy of {name} changed concurrently, retrying in {delay}s...")
+        time.sleep(delay)
+
+
 def setup_iam_permissions(c, project, cloudrun_sa, cloudbuild_sa, sql_project):
     """Set up IAM permissions."""
-    log_info("Setting up IAM permissions...")
+    logger.info("Setting up IAM permissions...")
 
     # Cloud Build permissions
-    c.run(f'gcloud projects add-iam-policy-binding "{project}" '
-          f'--member "serviceAccount:{cloudbuild_sa}" '
-          f'--role roles/iam.serviceAccountUser --quiet', hide=True)
-
-    c.run(f'gcloud projects add-iam-policy-binding "{project}" '
-          f'--member "serviceAccount:{cloudbuild_sa}" '
-          f'--role roles/run.admin --quiet', hide=True)
+    add_iam_bindings(c, "projects", project, project, [
+        ("roles/iam.serviceAccountUser", f"serviceAccount:{cloudbuild_sa}"),
+        ("roles/run.admin", f"serviceAccount:{cloudbuild_sa}"),
+    ])
 
     # Cloud SQL permissions (if using shared instance)
     if sql_project != project:
-        log_info(f"Setting up Cloud SQL permissions on {sql_project}...")
-        c.run(f'gcloud projects add-iam-policy-binding "{sql_project}" '
-              f'--member "serviceAccount:{cloudrun_sa}" '
-              f'--role roles/cloudsql.client --quiet', hide=True)
-
-        c.run(f'gcloud projects add-iam-policy-binding "{sql_project}" '
-              f'--member "serviceAccount:{cloudbuild_sa}" '
-              f'--role roles/cloudsql.client --quiet', hide=True)
+        logger.info(f"Setting up Cloud SQL permissions on {sql_project}...")
+        add_iam_bindings(c, "projects", sql_project, sql_project, [
+            ("roles/cloudsql.client", f"serviceAccount:{cloudrun_sa}"),
+            ("roles/cloudsql.client", f"serviceAccount:{cloudbuild_sa}"),
+        ])
 
 
-def setup_create_database(c, project, sql_instance, sql_project):
+def setup_create_database(c, project, sql_instance, sql_project, password=None):
     """Create database and user on Cloud SQL."""
-    log_info(f"Creating database on {sql_instance}...")
+    logger.info(f"Creating database on {sql_instance}...")
 
-    # Create database
-    c.run(f'gcloud sql databases create "{project}" '
-          f'--instance "{sql_instance}" '
-          f'--project "{sql_project}"', warn=True, hide=True)
-
-    # Create user with random password
-    log_info("Creating database user...")
-    password = generate_password()
-    result = c.run(f'gcloud sql users create "{project}" '
-                   f'--instance "{sql_instance}" '
-                   f'--project "{sql_project}" '
-                   f'--password "{password}"', warn=True, hide=True)
+    # Cloud SQL rejects a second operation on an instance while one is in
+    # progress, so the writes below stay sequential; the existence checks are
+    # only reads and run side by side.
+    databases = gcloud(c, f'sql databases list --instance "{sql_instance}" --format "value(name)"',
+                       sql_project, asynchronous=True, in_stream=False, warn=True, hide=True)
+    users = gcloud(c, f'sql users list --instance "{sql_instance}" --format "value(name)"',
+                   sql_project, asynchronous=True, in_stream=False, warn=True, hide=True)
 
-    if result.failed:
-        log_warn("User already exists, you may need to reset the password")
-        # Generate new password anyway for secrets
-        password = generate_password()
-        c.run(f'gcloud sql users set-password "{project}" '
-              f'--instance "{sql_instance}" '
-              f'--project "{sql_project}" '
-              f'--password "{password}"', warn=True, hide=True)
+    # Create database
+    if project in databases.join().stdout.split():
+        logger.info(f"Database {project} already exists")
+    else:
+        gcloud(c, f'sql databases create "{project}" --instance "{sql_instance}"',
+               sql_project, warn=True, hide=True)
+
+    # Create user with random password, or reset it straight away if the user
+    # already exists rather than waiting for the create to fail first
+    password = password or generate_password()
+    user_exists = project in users.join().stdout.split()
+    if not user_exists:
+        logger.info("Creating database user...")
+        result = gcloud(c, f'sql users create "{project}" --instance "{sql_instance}" '
+                           f'--password "{password}"', sql_project, warn=True, hide=True)
+        user_exists = result.failed
+
+    if user_exists:
+        logger.warning("User already exists, resetting its password")
+        gcloud(c, f'sql users set-password "{project}" --instance "{sql_instance}" '
+                  f'--password "{password}"', sql_project, warn=True, hide=True)
 
     return password
 
 
 def setup_create_bucket(c, project, bucket_name, region):
-    """Create Cloud Storage bucket."""
-    log_info(f"Creating storage bucket: {bucket_name}...")
-    c.run(f'gsutil mb -l "{region}" -p "{project}" "gs://{bucket_name}"',
-          warn=True, hide=True)
-
-    # Set CORS using temp file
-    log_info("Setting CORS configuration...")
-    import tempfile
-    import json
-    cors_config = [{"origin": ["*"], "responseHeader": ["Content-Type"], "method": ["GET", "HEAD"], "maxAgeSeconds": 3600}]
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-        json.dump(cors_config, f)
-        cors_file = f.name
+    """Create Cloud Storage bucket with its CORS configuration."""
+    from google.api_core.exceptions import Conflict, GoogleAPICallError
+
+    logger.info(f"Creating storage bucket: {bucket_name}...")
+    client = storage_client(project)
+    bucket = client.bucket(bucket_name)
+    # Sent with the create request, so a new bucket needs no second call
+    bucket.cors = [{"origin": ["*"], "responseHeader": ["Content-Type"], "method": ["GET", "HEAD"], "maxAgeSeconds": 3600}]
+    try:
+        client.create_bucket(bucket, project=project, location=region)
+        return
+    except Conflict:
+        logger.warning(f"Bucket {bucket_name} already exists, continuing...")
+    except GoogleAPICallError as e:
+        # Nothing to patch: the bucket may not exist at all
+        logger.error(f"Failed to create bucket {bucket_name}: {e}")
+        return
+
+    logger.info("Setting CORS configuration...")
     try:
-        c.run(f'gsutil cors set "{cors_file}" gs://{bucket_name}', warn=True)
-    finally:
-        os.unlink(cors_file)
+        bucket.patch()
+    except GoogleAPICallError as e:
+        logger.error(f"Failed to set CORS on {bucket_name}: {e}")
 
 
 def setup_create_secrets(c, project, secrets_name, bucket_name, db_password,
-                         sql_project, region, sql_instance, cloudrun_sa, cloudbuild_sa):
+                         sql_project, region, sql_instance, cloudrun_sa, cloudbuild_sa,
+                         secret_key=None):
     """Create secrets in Secret Manager."""
-    log_info("Creating secrets in Secret Manager...")
+    logger.info("Creating secrets in Secret Manager...")
 
-    secret_key = generate_password(50)
+    secret_key = secret_key or generate_password(50)
     database_url = f"postgres://{project}:{db_password}@//cloudsql/{sql_project}:{region}:{sql_instance}/{project}"
 
     secrets_content = f'''DATABASE_URL="{database_url}"
@@ -540,37 +854,25 @@ ALLOWED_HOSTS=".run.app"
 CORS_ALLOWED_ORIGINS=""
 '''
 
-    # Write to temp file
-    import tempfile
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.env', delete=False) as f:
-        f.write(secrets_content)
-        temp_file = f.name
+    from google.api_core.exceptions import AlreadyExists
 
+    client = secret_manager_client()
+    secret_path = client.secret_path(project, secrets_name)
     try:
-        # Try to create secret
-        result = c.run(f'gcloud secrets create "{secrets_name}" '
-                       f'--data-file="{temp_file}" '
-                       f'--project "{project}"', warn=True, hide=True)
-
-        if result.failed:
-            # Secret exists, add new version
-            c.run(f'gcloud secrets versions add "{secrets_name}" '
-                  f'--data-file="{temp_file}" '
-                  f'--project "{project}"', hide=True)
-    finally:
-        os.unlink(temp_file)
+        client.create_secret(parent=f"projects/{project}", secret_id=secrets_name,
+                             secret={"replication": {"automatic": {}}})
+    except AlreadyExists:
+        pass
 
-    # Grant secret access
-    log_info("Granting secret access...")
-    c.run(f'gcloud secrets add-iam-policy-binding "{secrets_name}" '
-          f'--member "serviceAccount:{cloudrun_sa}" '
-          f'--role roles/secretmanager.secretAccessor '
-          f'--project "{project}" --quiet', hide=True)
+    # The payload goes straight from memory, so it never touches the disk
+    client.add_secret_version(parent=secret_path, payload={"data": secrets_content.encode()})
 
-    c.run(f'gcloud secrets add-iam-policy-binding "{secrets_name}" '
-          f'--member "serviceAccount:{cloudbuild_sa}" '
-          f'--role roles/secretmanager.secretAccessor '
-          f'--project "{project}" --quiet', hide=True)
+    # Grant secret access
+    logger.info("Granting secret access...")
+    add_iam_bindings(c, "secrets", secrets_name, project, [
+        ("roles/secretmanager.secretAccessor", f"serviceAccount:{cloudrun_sa}"),
+        ("roles/secretmanager.secretAccessor", f"serviceAccount:{cloudbuild_sa}"),
+    ])
 
 
 @task(name="setup-apis")
@@ -581,10 +883,13 @@ def setup_apis(c, project=None):
 
 
 @task(name="setup-iam")
-def setup_iam(c, project=None):
-    """Set up IAM permissions for an existing project."""
+def setup_iam(c, project=None, project_number=None):
+    """Set up IAM permissions for an existing project.
+
+    Pass --project-number to skip looking it up.
+    """
     project = project or GCP_PROJECT_ID
-    cloudrun_sa, cloudbuild_sa = setup_get_service_accounts(c, project)
+    cloudrun_sa, cloudbuild_sa = setup_get_service_accounts(c, project, project_number)
     setup_iam_permissions(c, project, cloudrun_sa, cloudbuild_sa, CLOUD_SQL_PROJECT)
 
 
@@ -10,6 +10,10 @@
 # Usage: ./test_django.sh [--keep] [--no-docker]
 #   --keep      Don't cleanup the test directory after running
 #   --no-docker Run tests locally instead of in Docker
+#
+# Set PYTHON_IMAGE to test under another interpreter image (default: python:3.12-slim).
+# A PyPy image (e.g. pypy:3.10) needs a compiler and libpq headers, since
+# psycopg2-binary and grpcio ship no PyPy wheels.
 
 set -e
 
@@ -40,6 +44,7 @@ PROJECT_SLUG="test_django_project"
 DESCRIPTION="A test project for template validation"
 GCP_PROJECT="test-project"
 GCP_REGION="us-central1"
+PYTHON_IMAGE="${PYTHON_IMAGE:-python:3.12-slim}"
 
 info "Testing Django template"
 info "Template directory: $TEMPLATE_DIR"
@@ -87,10 +92,12 @@ if [ "$USE_DOCKER" = true ]; then
     # Run tests in Docker container
     info "Step 4: Running tests in Docker container"
     
-    docker run --rm -v "$PROJECT_DIR:/app" -w /app -e USE_SQLITE=true python:3.12-slim bash -c "
+    docker run --rm -v "$PROJECT_DIR:/app" -w /app -e USE_SQLITE=true "$PYTHON_IMAGE" bash -c "
         set -e
         echo 'Installing dependencies...'
         pip install -q -r requirements.txt
+        # Lets the parallel test runner send failure tracebacks back
+        pip install -q tblib
 
         echo 'Running migrations...'
         python manage.py migrate --run-syncdb
@@ -99,7 +106,7 @@ if [ "$USE_DOCKER" = true ]; then
         python manage.py check
 
         echo 'Running tests...'
-        python manage.py test --verbosity=2
+        python manage.py test --parallel --verbosity=2
 
         echo 'All tests passed!'
     "
@@ -135,13 +142,15 @@ else
     source .venv/bin/activate
 
     run_step "Install dependencies" pip install -q -r requirements.txt
+    # Lets the parallel test runner send failure tracebacks back
+    run_step "Install test dependencies" pip install -q tblib
 
     # Use SQLite for testing (no PostgreSQL required)
     export USE_SQLITE=true
 
     run_step "Run migrations" python manage.py migrate --run-syncdb
     run_step "Django system check" python manage.py check
-    run_step "Run tests" python manage.py test --verbosity=2
+    run_step "Run tests" python manage.py test --parallel --verbosity=2
 
     deactivate
 fi